@@ -36,8 +36,30 @@ fi
 
 # --- Table Creation ---
 echo "--- Ensuring table 'processed_messages' exists in '$DB_NAME' ---"
-TABLE_SQL="CREATE TABLE IF NOT EXISTS processed_messages (id SERIAL PRIMARY KEY, message_id VARCHAR(255) NOT NULL, content VARCHAR(255), processed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW());"
+TABLE_SQL="CREATE TABLE IF NOT EXISTS processed_messages (id SERIAL PRIMARY KEY, message_id VARCHAR(255) NOT NULL UNIQUE, content VARCHAR(255), processed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW());"
 psql  -h "$DB_HOST" -U "$DB_USER" -d "$DB_NAME" -c "$TABLE_SQL"
 
+# --- Unique message_id Index ---
+# Tables created before message_id was UNIQUE may already hold redelivered SQS
+# messages. When the index is missing, keep the first copy of each and add the
+# index the processor's ON CONFLICT DO NOTHING inserts rely on to skip
+# duplicates. The table is locked against inserts for the duration, so a
+# running processor cannot slip a duplicate in between the two statements.
+echo "--- Ensuring unique index on 'processed_messages.message_id' ---"
+INDEX_EXISTS=$(psql -h "$DB_HOST" -U "$DB_USER" -d "$DB_NAME" -t -c "SELECT 1 FROM pg_indexes WHERE tablename = 'processed_messages' AND indexname = 'processed_messages_message_id_key';" | xargs)
+
+if [ "$INDEX_EXISTS" == "1" ]; then
+    echo "✅ Unique index already exists."
+else
+    echo "Unique index not found. Removing duplicates and creating it..."
+    INDEX_SQL="BEGIN;
+LOCK TABLE processed_messages IN SHARE ROW EXCLUSIVE MODE;
+DELETE FROM processed_messages a USING processed_messages b WHERE a.message_id = b.message_id AND a.id > b.id;
+CREATE UNIQUE INDEX processed_messages_message_id_key ON processed_messages (message_id);
+COMMIT;"
+    psql -h "$DB_HOST" -U "$DB_USER" -d "$DB_NAME" -v ON_ERROR_STOP=1 -c "$INDEX_SQL"
+    echo "✅ Unique index created."
+fi
+
 echo "✅ Table 'processed_messages' is ready."
 echo "--- Database setup complete. ---"
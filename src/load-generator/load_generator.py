@@ -0,0 +1,282 @@
+# src/load-generator/load_generator.py
+# Patch the standard library before anything else is imported so that boto3's
+# urllib3 sockets and the generator's threads cooperate with gunicorn's gevent
+# worker instead of blocking it.
+from gevent import monkey
+monkey.patch_all()
+
+import bisect
+import os
+import queue
+import time
+import boto3
+import random
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template, request, jsonify
+from threading import Thread, Event, BoundedSemaphore
+import logging
+import uuid
+
+# --- Logging Setup ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- Flask App Setup ---
+app = Flask(__name__)
+
+# --- AWS Config ---
+SQS_QUEUE_URL = os.environ.get("SQS_QUEUE_URL")
+AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
+
+# --- Startup Checks ---
+# These run at import time because gunicorn imports the module and never
+# executes the __main__ block. Raising here makes the worker fail to boot,
+# which stops gunicorn instead of serving with a broken configuration.
+logging.info("--- Python Load Generator Starting Up ---")
+if not SQS_QUEUE_URL:
+    logging.error("FATAL: SQS_QUEUE_URL environment variable is not set. Exiting.")
+    raise RuntimeError("SQS_QUEUE_URL environment variable is not set")
+logging.info("SQS_QUEUE_URL: %s", SQS_QUEUE_URL)
+logging.info("AWS_REGION: %s", AWS_REGION)
+logging.info("---------------------------------------")
+
+# Number of threads sending batches to SQS concurrently.
+SENDER_WORKERS = int(os.environ.get("SENDER_WORKERS", "4"))
+# The HTTPS connection pool must be at least as large as the number of
+# threads using the client, otherwise urllib3 discards connections and the
+# next request pays a fresh TLS handshake. Adaptive retries back off
+# automatically when SQS throttles.
+SQS_CLIENT_CONFIG = Config(
+    max_pool_connections=max(64, SENDER_WORKERS),
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+# One explicit session resolves credentials and region once; its client is
+# thread-safe and shared by the sender pool and the Flask routes.
+SESSION = boto3.session.Session(region_name=AWS_REGION)
+sqs = SESSION.client("sqs", config=SQS_CLIENT_CONFIG)
+
+# --- Batching Config ---
+# SQS accepts at most 10 entries per SendMessageBatch request.
+SQS_MAX_BATCH_SIZE = 10
+# Messages falling due within this window are coalesced into one batch. At
+# 0.2s, batches only hold more than one message from 600 RPM upwards; the
+# UI slider tops out at 300 RPM, so UI-driven load keeps its one-message-per-
+# interval shape and sends single-entry batches. Higher rates, requested
+# through the /start API, are where batching cuts the number of SQS calls.
+BATCH_WINDOW_SECONDS = 0.2
+# How many intervals the scheduler may fall behind before it resets its
+# deadline instead of sending the missed batches back to back.
+MAX_SCHEDULE_LAG_INTERVALS = 5
+
+def send_batch(entries):
+    """
+    Sends up to 10 messages with a single SendMessageBatch call. Entries that
+    fail with a server-side error are retried once; anything still failing
+    is logged and dropped. Returns the number of messages sent.
+    """
+    response = sqs.send_message_batch(QueueUrl=SQS_QUEUE_URL, Entries=entries)
+    sent = len(response.get("Successful", []))
+    failed = response.get("Failed", [])
+
+    retryable = {f['Id'] for f in failed if not f.get('SenderFault')}
+    if retryable:
+        logging.warning("Retrying %d failed batch entries.", len(retryable))
+        retry_entries = [e for e in entries if e['Id'] in retryable]
+        response = sqs.send_message_batch(QueueUrl=SQS_QUEUE_URL, Entries=retry_entries)
+        sent += len(response.get("Successful", []))
+        failed = [f for f in failed if f.get('SenderFault')] + response.get("Failed", [])
+
+    for f in failed:
+        logging.error("Failed to send message %s to SQS: %s %s", f['Id'], f.get('Code'), f.get('Message'))
+
+    logging.info("-> Successfully sent %d of %d messages.", sent, len(entries))
+    return sent
+
+# --- Load Generation State ---
+class LoadGenerator:
+    # (body factory, log level, log message) for each message outcome, in
+    # threshold order. A None body simulates a failed send.
+    VARIANTS = (
+        (None, logging.ERROR, "Simulating a message send failure."),
+        (lambda: "This is a corrupted message.", logging.WARNING, "Sending corrupted message %s to SQS."),
+        (lambda: f"LoadGen message at {time.time()}", logging.DEBUG, "Sending message %s to SQS."),
+    )
+
+    def __init__(self):
+        self.thread = None
+        self.executor = None
+        self.in_flight = None
+        self.stop_event = Event()
+        self.requests_per_minute = 60
+        self.error_rate_percent = 0
+        self.latency_ms = 0
+        self.corruption_rate_percent = 0
+        self.is_running = False
+
+    def start(self, rpm, error_rate, latency_ms, corruption_rate):
+        if self.is_running:
+            logging.warning("Load generator is already running.")
+            return
+
+        self.requests_per_minute = rpm
+        self.error_rate_percent = error_rate
+        self.latency_ms = latency_ms
+        self.corruption_rate_percent = corruption_rate
+        # Messages due within one batch window are sent together in a single
+        # SendMessageBatch call, capped at the SQS limit of 10.
+        self._batch_size = min(SQS_MAX_BATCH_SIZE, max(1, int(rpm * BATCH_WINDOW_SECONDS / 60.0)))
+        self._sleep_interval = 60.0 * self._batch_size / rpm
+        # Cumulative thresholds over a single random draw per message: below
+        # the first is a simulated failure, below the second a corrupted
+        # message, anything else a normal message. Indexes into VARIANTS.
+        self._thresholds = [error_rate / 100.0, (error_rate + corruption_rate) / 100.0]
+        self.stop_event.clear()
+        self.executor = ThreadPoolExecutor(max_workers=SENDER_WORKERS, thread_name_prefix="sqs-sender")
+        # Bounds the number of queued batches so a slow SQS cannot make the
+        # scheduler pile up work faster than the senders drain it.
+        self.in_flight = BoundedSemaphore(SENDER_WORKERS * 2)
+        self.thread = Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        self.is_running = True
+        logging.info("✅ Load generator started with %d RPM, %d%% error rate, %dms latency, and %d%% corruption rate.", rpm, error_rate, latency_ms, corruption_rate)
+
+    def stop(self):
+        if not self.is_running:
+            logging.warning("Load generator is not running.")
+            return
+
+        self.stop_event.set()
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+        self.is_running = False
+        logging.info("✅ Load generator stopped.")
+
+    def _send_batch(self, entries):
+        try:
+            send_batch(entries)
+        except Exception as e:
+            logging.error("Failed to send message to SQS: %s", e)
+        finally:
+            self.in_flight.release()
+
+    def run(self):
+        """Schedules batches at the target rate and hands them to the sender pool."""
+        # Batches are paced against absolute monotonic deadlines so time spent
+        # building and submitting a batch does not stretch the period. Injected
+        # latency is added on top so it still slows the generator down.
+        deadline = time.monotonic()
+        while not self.stop_event.is_set():
+            pending = []
+            injected_seconds = 0.0
+
+            try:
+                for _ in range(self._batch_size):
+                    # Latency is injected before every message, as the UI
+                    # describes, rather than once per batch.
+                    if self.latency_ms > 0:
+                        delay_seconds = self.latency_ms / 1000.0
+                        logging.info("Injecting %.2fs of latency.", delay_seconds)
+                        # Waiting on stop_event cuts injected latency short on stop()
+                        if self.stop_event.wait(delay_seconds):
+                            return
+                        injected_seconds += delay_seconds
+
+                    make_body, level, log_message = self.VARIANTS[bisect.bisect(self._thresholds, random.random())]
+                    if make_body is None:
+                        logging.log(level, log_message)
+                        continue
+
+                    message_id = uuid.uuid4().hex
+                    logging.log(level, log_message, message_id)
+                    pending.append({'Id': message_id, 'MessageBody': make_body()})
+
+                if pending:
+                    self.in_flight.acquire()
+                    self.executor.submit(self._send_batch, pending)
+
+            except Exception as e:
+                logging.error("Failed to send message to SQS: %s", e)
+
+            deadline += self._sleep_interval + injected_seconds
+            now = time.monotonic()
+            if now - deadline > MAX_SCHEDULE_LAG_INTERVALS * self._sleep_interval:
+                # Too far behind schedule; drop the backlog rather than burst to catch up
+                deadline = now
+            if self.stop_event.wait(max(0.0, deadline - now)):
+                break
+
+# Global instance of the load generator
+load_gen = LoadGenerator()
+
+# --- Single Invocation Outbox ---
+# /invoke-once queues its message here and returns immediately; a background
+# sender drains the queue, coalescing up to 10 waiting messages per batch.
+outbox = queue.Queue(maxsize=10_000)
+
+def drain_outbox():
+    while True:
+        entries = [outbox.get()]
+        while len(entries) < SQS_MAX_BATCH_SIZE:
+            try:
+                entries.append(outbox.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            send_batch(entries)
+        except Exception as e:
+            logging.error("Failed to send single messages: %s", e)
+
+outbox_sender = Thread(target=drain_outbox)
+outbox_sender.daemon = True
+outbox_sender.start()
+
+# --- API Endpoints ---
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/start', methods=['POST'])
+def start_load():
+    data = request.json
+    rpm = int(data.get('rpm', 60))
+    if rpm <= 0:
+        # The scheduler divides by rpm; zero or negative rates are not meaningful
+        return jsonify({"status": "error", "message": "rpm must be greater than 0"}), 400
+    error_rate = int(data.get('error_rate', 0))
+    latency_ms = int(data.get('latency_ms', 0))
+    corruption_rate = int(data.get('corruption_rate', 0))
+    load_gen.start(rpm, error_rate, latency_ms, corruption_rate)
+    return jsonify({"status": "started"})
+
+@app.route('/stop', methods=['POST'])
+def stop_load():
+    load_gen.stop()
+    return jsonify({"status": "stopped"})
+
+@app.route('/status')
+def status():
+    return jsonify({
+        "running": load_gen.is_running,
+        "rpm": load_gen.requests_per_minute,
+        "error_rate": load_gen.error_rate_percent,
+        "latency_ms": load_gen.latency_ms,
+        "corruption_rate": load_gen.corruption_rate_percent
+    })
+
+@app.route('/invoke-once', methods=['POST'])
+def invoke_once():
+    message_id = uuid.uuid4().hex
+    message_content = f"Single invocation at {time.time()}"
+    try:
+        outbox.put_nowait({'Id': message_id, 'MessageBody': message_content})
+    except queue.Full:
+        logging.error("Outbox is full, dropping single-invoke message %s.", message_id)
+        return jsonify({"status": "error", "message": "outbox is full"}), 503
+    logging.info("Queued single-invoke message %s for SQS.", message_id)
+    return jsonify({"status": "queued", "message_id": message_id}), 202
+
+if __name__ == "__main__":
+    # Local development only; the container runs the app under gunicorn.
+    app.run(host='0.0.0.0', port=8080)
@@ -1,17 +1,25 @@
 # processor.py
+import contextvars
 import os
-import time
+import signal
 import boto3
 import psycopg2
+from botocore.config import Config
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from opentelemetry import trace
 from flask import Flask
 from prometheus_flask_exporter import PrometheusMetrics
-from threading import Thread
+from waitress import serve
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Event, Lock, BoundedSemaphore
 import logging
 
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# A failing log handler must never break message processing
+logging.raiseExceptions = False
 
 # --- Flask & Prometheus Setup ---
 app = Flask(__name__)
@@ -22,104 +30,356 @@ tracer = trace.get_tracer(__name__)
 
 # --- AWS & DB Config ---
 SQS_QUEUE_URL = os.environ.get("SQS_QUEUE_URL")
+AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 DB_HOST = os.environ.get("DB_HOST")
 DB_NAME = os.environ.get("DB_NAME", "telemetryhubdb")
 DB_USER = os.environ.get("DB_USER", "dbadmin")
 DB_PASS = os.environ.get("DB_PASSWORD")
 # -----------------------
 
-sqs = boto3.client("sqs", region_name=os.environ.get("AWS_REGION", "us-east-1"))
+# Long polls wait up to the SQS maximum of 20 seconds for messages, so an idle
+# queue costs about three receive calls a minute per poller (POLLER_THREADS).
+SQS_WAIT_TIME_SECONDS = 20
 
-def get_db_connection(db_name_override=None):
-    """Establishes a new connection to the PostgreSQL database using SSL."""
+# A larger HTTPS connection pool avoids discarding connections (and paying a
+# new TLS handshake) when several threads share the client. Adaptive retries
+# back off automatically when SQS throttles. The read timeout only needs to
+# outlast a long poll, so a hung connection is noticed well before botocore's
+# 60 second default.
+SQS_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    connect_timeout=3,
+    read_timeout=SQS_WAIT_TIME_SECONDS + 5
+)
+# One explicit session resolves credentials and region once; its client is
+# thread-safe and shared by the poller and the batch workers.
+SESSION = boto3.session.Session(region_name=AWS_REGION)
+sqs = SESSION.client("sqs", config=SQS_CLIENT_CONFIG)
+
+# --- Polling Config ---
+# After an empty poll the loop waits IDLE_BACKOFF_BASE seconds, doubling on
+# each consecutive empty poll up to IDLE_BACKOFF_MAX. Any non-empty poll
+# resets the backoff so a busy queue is drained without pauses. The long
+# poll already does the real waiting, so the cap stays small.
+IDLE_BACKOFF_BASE = 0.1
+IDLE_BACKOFF_MAX = 1.0
+
+# Set on SIGTERM so the processing loop exits promptly.
+stop_event = Event()
+
+# SQS returns and deletes at most 10 messages per batch call.
+SQS_MAX_BATCH_SIZE = 10
+
+# Messages stored in the database whose batch delete failed server-side.
+# They are retried on the next poll, before their receipt handles expire.
+# The list is capped so a delete error that never clears cannot grow it
+# without bound; dropping the oldest entries is safe because a redelivered
+# message is skipped by the ON CONFLICT DO NOTHING insert.
+MAX_PENDING_DELETES = 100
+pending_deletes = []
+pending_deletes_lock = Lock()
+
+def requeue_deletes(messages):
+    """Queues messages for a delete retry on the next poll, dropping the oldest past the cap."""
+    with pending_deletes_lock:
+        pending_deletes.extend(messages)
+        overflow = len(pending_deletes) - MAX_PENDING_DELETES
+        if overflow > 0:
+            del pending_deletes[:overflow]
+    if overflow > 0:
+        logging.warning("Dropped %d pending deletes over the cap of %d; SQS will redeliver them.", overflow, MAX_PENDING_DELETES)
+
+# --- Batch Processing Pool ---
+# Received batches are written to the database on worker threads, so the next
+# SQS poll overlaps with the previous batch's inserts and deletes. The
+# semaphore bounds in-flight batches to the number of workers.
+BATCH_WORKERS = 4
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch-worker")
+batch_slots = BoundedSemaphore(BATCH_WORKERS)
+# Independent long-poll loops feeding the executor. Each takes a batch slot
+# before polling, so pollers plus in-flight batches never exceed BATCH_WORKERS.
+POLLER_THREADS = 2
+
+# --- DB Connection Pool ---
+# Connections are reused across polls instead of paying the TCP, TLS and
+# PostgreSQL startup cost for every batch. One connection per batch worker.
+DB_POOL_MIN_CONN = 1
+DB_POOL_MAX_CONN = BATCH_WORKERS
+db_pool = None
+db_pool_lock = Lock()
+
+# --- SQL Statements ---
+# Built once as bytes so psycopg2 does not re-encode the query text on every call.
+# SQS delivers at least once, so inserts skip rows that violate the unique
+# message_id index instead of storing a redelivered message twice.
+INSERT_BATCH_SQL = b"INSERT INTO processed_messages (message_id, content) VALUES %s ON CONFLICT DO NOTHING"
+PREPARE_INSERT_SQL = (
+    b"PREPARE processed_messages_insert (varchar, varchar) AS "
+    b"INSERT INTO processed_messages (message_id, content) VALUES ($1, $2) ON CONFLICT DO NOTHING"
+)
+INSERT_ROW_SQL = b"SAVEPOINT message_insert; EXECUTE processed_messages_insert (%s, %s)"
+ROLLBACK_ROW_SQL = b"ROLLBACK TO SAVEPOINT message_insert"
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """A connection that remembers whether the insert statement has been prepared on it."""
+    insert_prepared = False
+
+def prepare_insert(conn):
+    """
+    Prepares the row insert as a server-side statement the first time a pooled
+    connection is checked out, so row-by-row inserts skip parsing and planning.
+    """
+    if conn.insert_prepared:
+        return
+    with conn.cursor() as cur:
+        cur.execute(PREPARE_INSERT_SQL)
+    conn.commit()
+    conn.insert_prepared = True
+
+def get_db_connection_params(db_name):
+    """Returns the psycopg2 connection parameters for the given database."""
+    return {
+        "host": DB_HOST,
+        "dbname": db_name,
+        "user": DB_USER,
+        "password": DB_PASS,
+        # Use sslmode='require' for secure connections to RDS
+        "sslmode": "require",
+        # Keep idle pooled connections alive between polls and notice dead
+        # peers within about a minute instead of stalling on the next batch
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+        "connect_timeout": 5,
+        "application_name": "telemetryhub-proc",
+    }
+
+def get_db_pool():
+    """
+    Returns the shared connection pool, creating it on first use so that an
+    unreachable database at startup does not prevent the processor from running.
+    """
+    global db_pool
+    if db_pool is not None:
+        return db_pool
     if not DB_PASS:
         logging.error("FATAL: DB_PASSWORD environment variable is not set.")
         return None
-    
-    db_to_connect = db_name_override if db_name_override else DB_NAME
-    
-    conn = None
+
+    with db_pool_lock:
+        if db_pool is None:
+            try:
+                db_pool = ThreadedConnectionPool(
+                    DB_POOL_MIN_CONN, DB_POOL_MAX_CONN,
+                    connection_factory=PreparedConnection,
+                    **get_db_connection_params(DB_NAME)
+                )
+            except Exception as e:
+                logging.error("Failed to create connection pool for database '%s': %s", DB_NAME, e)
+                return None
+    return db_pool
+
+def insert_messages(conn, messages):
+    """
+    Inserts a batch of messages with a single statement and a single commit.
+    If the batch fails, falls back to inserting row by row inside one
+    transaction, using a savepoint per row so that one bad message does not
+    block the rest. Returns the messages that were stored.
+    """
+    rows = [(msg['MessageId'], msg['Body']) for msg in messages]
     try:
-        # Use sslmode='require' for secure connections to RDS
-        conn_string = f"host={DB_HOST} dbname={db_to_connect} user={DB_USER} password={DB_PASS} sslmode='require'"
-        conn = psycopg2.connect(conn_string)
-        return conn
+        with conn.cursor() as cur:
+            execute_values(cur, INSERT_BATCH_SQL, rows)
+        conn.commit()
+        return messages
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.warning("Batch insert of %d messages failed, retrying row by row: %s", len(messages), e)
+
+    # Failures are recorded on the enclosing batch span rather than opening a
+    # span per message.
+    span = trace.get_current_span()
+    stored = []
+    with conn.cursor() as cur:
+        for msg in messages:
+            message_id = msg['MessageId']
+            logging.debug("Processing message: %s", message_id)
+            try:
+                cur.execute(INSERT_ROW_SQL, (message_id, msg['Body']))
+                stored.append(msg)
+            except psycopg2.Error as e:
+                cur.execute(ROLLBACK_ROW_SQL)
+                logging.error("Error processing message %s: %s", message_id, e, exc_info=True)
+                span.set_attribute("error", True)
+                span.record_exception(e, attributes={"message.id": message_id})
+    conn.commit()
+    return stored
+
+def delete_messages(messages):
+    """
+    Deletes processed messages from the queue using DeleteMessageBatch calls of
+    up to 10 entries. Deletes that failed server-side on an earlier poll are
+    retried first and logged on their own line. Returns the number of the
+    given messages that were deleted, excluding carried-over retries.
+    """
+    with pending_deletes_lock:
+        carried_over = len(pending_deletes)
+        messages = pending_deletes + list(messages)
+        pending_deletes.clear()
+
+    deleted = 0
+    retried = 0
+    retry = []
+    start = 0
+    try:
+        for start in range(0, len(messages), SQS_MAX_BATCH_SIZE):
+            chunk = messages[start:start + SQS_MAX_BATCH_SIZE]
+            entries = [{'Id': str(i), 'ReceiptHandle': msg['ReceiptHandle']} for i, msg in enumerate(chunk)]
+            response = sqs.delete_message_batch(QueueUrl=SQS_QUEUE_URL, Entries=entries)
+            for success in response.get("Successful", []):
+                # Carried-over retries come first in the combined list
+                if start + int(success['Id']) < carried_over:
+                    retried += 1
+                else:
+                    deleted += 1
+            for failure in response.get("Failed", []):
+                msg = chunk[int(failure['Id'])]
+                logging.error("Failed to delete message %s: %s %s", msg['MessageId'], failure.get('Code'), failure.get('Message'))
+                if not failure.get('SenderFault'):
+                    retry.append(msg)
+    except Exception:
+        # Keep everything not yet deleted for the next poll instead of losing it
+        requeue_deletes(retry + messages[start:])
+        raise
+
+    if retried:
+        logging.info("Deleted %d messages carried over from earlier polls.", retried)
+    if retry:
+        logging.warning("Will retry deleting %d messages on the next poll.", len(retry))
+        requeue_deletes(retry)
+    return deleted
+
+def handle_batch(messages):
+    """
+    Writes a received batch to the database and deletes it from the queue.
+    Runs on the batch executor and frees its slot when done.
+    """
+    try:
+        with tracer.start_as_current_span("write_sqs_batch") as span:
+            span.set_attribute("messages.count", len(messages))
+            pool = get_db_pool()
+            if pool is None:
+                logging.error("Cannot process messages, no database connection.")
+                return
+
+            conn = pool.getconn()
+            try:
+                prepare_insert(conn)
+                stored = insert_messages(conn, messages)
+            finally:
+                # Broken connections are discarded rather than handed out again
+                pool.putconn(conn, close=bool(conn.closed))
+            span.set_attribute("messages.errors", len(messages) - len(stored))
+
+            deleted = delete_messages(stored) if stored else 0
+            logging.info("Batch: inserted=%d deleted=%d failed=%d", len(stored), deleted, len(messages) - len(stored))
     except Exception as e:
-        logging.error(f"Failed to connect to the database '{db_to_connect}': {e}")
-        return None
+        logging.error("An unhandled error occurred while handling a batch: %s", e, exc_info=True)
+    finally:
+        batch_slots.release()
 
 def process_messages():
     """
-    Receives a batch of messages from SQS, processes them, writes to the database,
-    and deletes them from the queue.
+    Receives a batch of messages from SQS and hands it to the batch executor,
+    which writes it to the database and deletes it from the queue. Returns the
+    number of messages received.
     """
+    if get_db_pool() is None:
+        logging.error("Cannot process messages, no database connection.")
+        # Wait before retrying
+        stop_event.wait(10)
+        return 0
+
+    # Only poll once a worker is free, so received messages are never left
+    # waiting on a busy executor while their visibility timeout runs down.
+    batch_slots.acquire()
+    submitted = False
     try:
         with tracer.start_as_current_span("process_sqs_batch") as span:
             logging.info("Polling SQS for new messages...")
             response = sqs.receive_message(
                 QueueUrl=SQS_QUEUE_URL,
-                MaxNumberOfMessages=5,
-                WaitTimeSeconds=10
+                MaxNumberOfMessages=SQS_MAX_BATCH_SIZE,
+                WaitTimeSeconds=SQS_WAIT_TIME_SECONDS
             )
             messages = response.get("Messages", [])
             span.set_attribute("messages.count", len(messages))
 
             if not messages:
                 logging.info("No messages received in this poll.")
-                return
+                if pending_deletes:
+                    delete_messages([])
+                return 0
 
-            logging.info(f"Received {len(messages)} messages to process.")
-            conn = get_db_connection()
-            if conn is None:
-                logging.error("Cannot process messages, no database connection.")
-                # Wait before retrying
-                time.sleep(10)
-                return
-
-            for msg in messages:
-                with tracer.start_as_current_span("process_single_message") as msg_span:
-                    message_id = msg['MessageId']
-                    content = msg['Body']
-                    msg_span.set_attribute("message.id", message_id)
-                    logging.info(f"Processing message: {message_id}")
-
-                    try:
-                        cur = conn.cursor()
-                        cur.execute(
-                            "INSERT INTO processed_messages (message_id, content) VALUES (%s, %s)",
-                            (message_id, content)
-                        )
-                        conn.commit()
-                        cur.close()
-                        sqs.delete_message(QueueUrl=SQS_QUEUE_URL, ReceiptHandle=msg['ReceiptHandle'])
-                        logging.info(f"Successfully processed and deleted message {message_id}")
-                    except Exception as e:
-                        logging.error(f"Error processing message {message_id}: {e}", exc_info=True)
-                        msg_span.set_attribute("error", True)
-                        msg_span.record_exception(e)
-            conn.close()
+            logging.info("Received %d messages to process.", len(messages))
+            # Run the batch in the current context so its spans stay children of this one
+            batch_executor.submit(contextvars.copy_context().run, handle_batch, messages)
+            submitted = True
+            return len(messages)
     except Exception as e:
-        logging.error(f"An unhandled error occurred in process_messages loop: {e}", exc_info=True)
+        logging.error("An unhandled error occurred in process_messages loop: %s", e, exc_info=True)
+        return 0
+    finally:
+        if not submitted:
+            batch_slots.release()
 
 
 def main_loop():
     """The main application loop that continuously processes messages."""
     logging.info("Starting data processor loop...")
-    while True:
-        process_messages()
-        time.sleep(5)
+    backoff = IDLE_BACKOFF_BASE
+    while not stop_event.is_set():
+        if process_messages():
+            backoff = IDLE_BACKOFF_BASE
+            continue
+        if stop_event.wait(backoff):
+            break
+        backoff = min(backoff * 2, IDLE_BACKOFF_MAX)
+    logging.info("Data processor loop stopped.")
+
+def handle_sigterm(signum, frame):
+    """Stops the processing loops so Kubernetes can terminate the pod promptly."""
+    logging.info("Received SIGTERM, shutting down...")
+    stop_event.set()
 
 if __name__ == "__main__":
     # --- Initial Setup ---
     # This startup sequence is now robust against race conditions with RDS.
     logging.info("--- Python Processor Starting Up ---")
-    
-    # --- Start Application Threads ---
-    logging.info("Starting background message processing thread...")
-    processing_thread = Thread(target=main_loop)
-    processing_thread.daemon = True
-    processing_thread.start()
 
     # --- Run Flask App ---
+    # Waitress serves metrics from a background thread so scrapes never compete
+    # with the processing loop, which owns the main thread.
     logging.info("Starting Flask server for metrics on port 8000...")
-    app.run(host='0.0.0.0', port=8000)
+    metrics_thread = Thread(target=serve, args=(app,), kwargs={"host": "0.0.0.0", "port": 8000, "threads": 2})
+    metrics_thread.daemon = True
+    metrics_thread.start()
+
+    # --- Start Processing Loops ---
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    logging.info("Starting %d message processing loops...", POLLER_THREADS)
+    pollers = [Thread(target=main_loop) for _ in range(POLLER_THREADS - 1)]
+    for poller in pollers:
+        poller.daemon = True
+        poller.start()
+    main_loop()
+
+    # --- Shutdown ---
+    # Let in-flight batches finish so their messages are committed and deleted.
+    for poller in pollers:
+        poller.join()
+    batch_executor.shutdown(wait=True)
+    logging.info("--- Python Processor Stopped ---")